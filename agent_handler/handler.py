@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from agent_handler.agent import agent
+from agent_handler.agent import agent, agent_stream, served_from_cache
 
 
 handle_query = APIRouter()
@@ -9,9 +10,28 @@ class QueryRequest(BaseModel):
     query: str
 
 @handle_query.post("/")
-async def query_agent(request: QueryRequest):
+async def query_agent(request: QueryRequest, response: Response):
     try:
-        response = agent(request.query)
-        return {"response": response}
+        result = await agent(request.query)
+        # agent() records whether it answered from cache, so the header is
+        # both free and always in agreement with what actually happened.
+        response.headers["X-Cache"] = "HIT" if served_from_cache.get() else "MISS"
+        return {"response": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@handle_query.post("/stream")
+async def query_agent_stream(request: QueryRequest):
+    """Streams the agent output as Server-Sent Events, one frame per token,
+    so callers see tokens as soon as the model produces them."""
+
+    async def sse_frames():
+        try:
+            async for token in agent_stream(request.query):
+                yield f"data: {token}\n\n"
+        except Exception as e:
+            yield f"data: [error] {e}\n\n"
+        yield "data: [done]\n\n"
+
+    return StreamingResponse(sse_frames(), media_type="text/event-stream")
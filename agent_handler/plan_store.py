@@ -0,0 +1,52 @@
+import os
+import sqlite3
+import threading
+from hashlib import blake2b
+
+import orjson
+
+# On-disk lookup table of query -> action plan. Once the planner has routed a
+# query, replays of the same query resolve in microseconds without the LLM.
+_DB_PATH = os.getenv("PLAN_STORE_PATH", "plan_store.db")
+
+_lock = threading.Lock()
+_conn = None
+
+
+def _connect() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(_DB_PATH, check_same_thread=False)
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS plans ("
+            "query_hash BLOB PRIMARY KEY, plan BLOB NOT NULL)"
+        )
+        _conn.commit()
+    return _conn
+
+
+def plan_key(query: str) -> bytes:
+    return blake2b(query.strip().lower().encode(), digest_size=16).digest()
+
+
+def get_plan(query: str):
+    """Returns the stored action plan for this query, or None on a miss."""
+    with _lock:
+        row = (
+            _connect()
+            .execute(
+                "SELECT plan FROM plans WHERE query_hash = ?", (plan_key(query),)
+            )
+            .fetchone()
+        )
+    return orjson.loads(row[0]) if row else None
+
+
+def put_plan(query: str, plan: dict):
+    with _lock:
+        conn = _connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO plans (query_hash, plan) VALUES (?, ?)",
+            (plan_key(query), orjson.dumps(plan)),
+        )
+        conn.commit()
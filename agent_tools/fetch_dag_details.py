@@ -1,18 +1,59 @@
 from dotenv import load_dotenv
-import requests
-import json
+import httpx
+import logging
+import orjson
 import os
+import asyncio
 from typing import Dict, Optional, List, Any
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 AIRFLOW_URL = "http://localhost:8080"
 USERNAME = "airflow"
 PASSWORD = "airflow"
 
-def fetch_dag_details(dag_name: str) -> Optional[Dict[str, Any]]:
+import cache
+
+# Shared async client so every Airflow call reuses the same keep-alive pool.
+_HTTP = httpx.AsyncClient(
+    auth=(USERNAME, PASSWORD),
+    headers={"Accept": "application/json"},
+    timeout=10,
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+    transport=httpx.AsyncHTTPTransport(retries=2),
+)
+
+DAG_LIST_CACHE_KEY = "airflow:dags"
+DAG_LIST_CACHE_TTL = 60  # the DAG list changes slowly
+DAG_DETAILS_CACHE_TTL = 300
+
+# Endpoint templates, formatted per call instead of rebuilding f-strings inline.
+_URL_DAGS = f"{AIRFLOW_URL}/api/v1/dags"
+_URL_DAG = _URL_DAGS + "/{dag_id}"
+_URL_DAG_RUNS = _URL_DAG + "/dagRuns"
+_URL_TASK_INSTANCES = _URL_DAG_RUNS + "/{run_id}/taskInstances"
+
+# Cap concurrent requests so a DAG with a long run history cannot flood Airflow.
+_FANOUT_LIMIT = 16
+
+# Only the most recent runs are useful for failure triage; DAGs with years of
+# history would otherwise balloon both memory and the per-run task fan-out.
+_MAX_RUNS = 20
+
+
+async def _fetch_task_instances(dag_id: str, run_id: str, semaphore: "asyncio.Semaphore") -> List[Dict[str, Any]]:
+    """Fetches the task instances for a single DAG run."""
+    task_instances_url = _URL_TASK_INSTANCES.format(dag_id=dag_id, run_id=run_id)
+    async with semaphore:
+        response = await _HTTP.get(task_instances_url, params={"limit": 100})
+    response.raise_for_status()
+    return orjson.loads(response.content).get("task_instances", [])
+
+async def fetch_dag_details(dag_name: str) -> Optional[Dict[str, Any]]:
     """
     Fetches detailed information about a specific DAG from Airflow.
 
@@ -22,18 +63,41 @@ def fetch_dag_details(dag_name: str) -> Optional[Dict[str, Any]]:
     Returns:
         Optional[Dict[str, Any]]: A dictionary containing the DAG details, or None if the DAG is not found or an error occurs.
     """
-    url = f"{AIRFLOW_URL}/api/v1/dags"
+    # Serve repeated lookups for the same DAG straight from the cache; the
+    # sync Redis client runs in the executor to avoid blocking the loop.
+    cached_details = await asyncio.to_thread(
+        cache.cache_get, f"airflow:dag_details:{dag_name}"
+    )
+    if cached_details is not None:
+        return orjson.loads(cached_details)
 
     try:
-        response = requests.get(url, auth=(USERNAME, PASSWORD))
-        response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
-        dags: List[Dict[str, Any]] = response.json().get("dags", [])
-
-        # Find the specified DAG
-        dag_info: Optional[Dict[str, Any]] = next((dag for dag in dags if dag.get("dag_display_name") == dag_name), None)
+        # If the caller already passed a dag_id, a direct lookup avoids
+        # transferring and scanning the whole DAG list.
+        dag_info: Optional[Dict[str, Any]] = None
+        direct_response = await _HTTP.get(_URL_DAG.format(dag_id=dag_name))
+        if direct_response.status_code == 200:
+            dag_info = orjson.loads(direct_response.content)
+        else:
+            cached_dags = await asyncio.to_thread(cache.cache_get, DAG_LIST_CACHE_KEY)
+            if cached_dags is not None:
+                dags: List[Dict[str, Any]] = orjson.loads(cached_dags)
+            else:
+                response = await _HTTP.get(_URL_DAGS)
+                response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
+                dags = orjson.loads(response.content).get("dags", [])
+                await asyncio.to_thread(
+                    cache.cache_set,
+                    DAG_LIST_CACHE_KEY,
+                    orjson.dumps(dags).decode(),
+                    DAG_LIST_CACHE_TTL,
+                )
+
+            # Find the specified DAG
+            dag_info = next((dag for dag in dags if dag.get("dag_display_name") == dag_name), None)
 
         if not dag_info:
-            print(f"DAG with name '{dag_name}' not found.")
+            logger.warning(f"DAG with name '{dag_name}' not found.")
             return None
 
         dag_id: str = dag_info.get("dag_id", "unknown")
@@ -43,25 +107,32 @@ def fetch_dag_details(dag_name: str) -> Optional[Dict[str, Any]]:
         dag_last_updated: str = dag_info.get("last_updated", "Unknown")
 
         # Fetching the latest DAG runs for additional details
-        dag_runs_url = f"{AIRFLOW_URL}/api/v1/dags/{dag_id}/dagRuns"
-        dag_runs_response = requests.get(dag_runs_url, auth=(USERNAME, PASSWORD))
+        # Ask Airflow for just the newest runs instead of the full history.
+        dag_runs_response = await _HTTP.get(
+            _URL_DAG_RUNS.format(dag_id=dag_id),
+            params={"limit": _MAX_RUNS, "order_by": "-execution_date"},
+        )
         dag_runs_response.raise_for_status()
-        dag_runs: List[Dict[str, Any]] = dag_runs_response.json().get("dag_runs", [])
+        dag_runs: List[Dict[str, Any]] = orjson.loads(dag_runs_response.content).get("dag_runs", [])
+
+        # Fetch the task instances for every run concurrently; total latency is
+        # bounded by the slowest single request instead of the sum of all of them.
+        semaphore = asyncio.Semaphore(_FANOUT_LIMIT)
+        task_instance_lists = await asyncio.gather(
+            *(
+                _fetch_task_instances(dag_id, run.get("dag_run_id", "unknown"), semaphore)
+                for run in dag_runs
+            )
+        )
 
         # Collecting run details
         run_details: List[Dict[str, Any]] = []
-        for run in dag_runs:
+        for run, task_instances in zip(dag_runs, task_instance_lists):
             run_id: str = run.get("dag_run_id", "unknown")
             execution_date: str = run.get("execution_date", "unknown")
             run_date: str = run.get("start_date", "unknown")  # Assuming start_date is the run date
             state: str = run.get("state", "unknown")
 
-            # Fetching task instances for the current run
-            task_instances_url = f"{AIRFLOW_URL}/api/v1/dags/{dag_id}/dagRuns/{run_id}/taskInstances"
-            task_instances_response = requests.get(task_instances_url, auth=(USERNAME, PASSWORD))
-            task_instances_response.raise_for_status()
-            task_instances: List[Dict[str, Any]] = task_instances_response.json().get("task_instances", [])
-
             # Collecting task instance details
             task_details: List[Dict[str, Any]] = []
             for task in task_instances:
@@ -101,24 +172,33 @@ def fetch_dag_details(dag_name: str) -> Optional[Dict[str, Any]]:
             "runs": run_details,  # Adding run details to the DAG info
         }
 
+        await asyncio.to_thread(
+            cache.cache_set,
+            f"airflow:dag_details:{dag_name}",
+            orjson.dumps(detailed_dag_info).decode(),
+            DAG_DETAILS_CACHE_TTL,
+        )
+
         return detailed_dag_info
 
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching DAG details: {e}")
+    except httpx.HTTPError as e:
+        logger.error(f"Error fetching DAG details: {e}")
         return None
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON response: {e}")
+    except orjson.JSONDecodeError as e:
+        logger.error(f"Error decoding JSON response: {e}")
         return None
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        logger.error(f"An unexpected error occurred: {e}")
         return None
         return {}
 
 # Example usage
 if __name__ == "__main__":
+    import asyncio
+
     dag_name = "modern_slack_notification_dag"  # Replace with the actual DAG name you want to fetch
-    dag_details = fetch_dag_details(dag_name)
+    dag_details = asyncio.run(fetch_dag_details(dag_name))
     if dag_details:
-        print(json.dumps(dag_details, indent=2))
+        print(orjson.dumps(dag_details, option=orjson.OPT_INDENT_2).decode())
     else:
         print("Failed to fetch DAG details.")
@@ -1,90 +1,171 @@
-import requests
-import json
+import asyncio
+import logging
+
+import httpx
+import orjson
 import os
+from cachetools import TTLCache
 from dotenv import load_dotenv
 from langchain_core.tools import tool
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 AIRFLOW_URL = "http://localhost:8080"
 USERNAME = "airflow"
 PASSWORD = "airflow"
 
-# def fetch_dags() -> list:
-#     url = f"{AIRFLOW_URL}/api/v1/dags"
-#     try:
-#         response = requests.get(url, auth=(USERNAME, PASSWORD))
-#         response.raise_for_status()
-#         data = response.json()
-#         # Return a list of dictionaries containing dag_id and dag_name
-#         return [
-#             {
-#                 "dag_id": dag.get("dag_id", "unknown"),
-#                 "dag_name": dag.get("dag_display_name", "unknown"),
-#             }
-#             for dag in data.get("dags", [])
-#         ]
-#     except Exception as e:
-#         print(f"Error fetching DAGs: {e}")
-#         return []
-
-
-def fetch_logs_for_dag(dag_id: str) -> dict:
-    dag_runs_url = f"{AIRFLOW_URL}/api/v1/dags/{dag_id}/dagRuns"
+# One pooled async client for all Airflow calls: connections are kept alive
+# and reused, and independent requests within a fetch run concurrently.
+_HTTP = httpx.AsyncClient(
+    auth=(USERNAME, PASSWORD),
+    headers={"Accept": "application/json"},
+    timeout=10,
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+    transport=httpx.AsyncHTTPTransport(retries=2),
+)
+
+# Cap on in-flight log requests so a wide DAG doesn't stampede the API.
+_FANOUT_LIMIT = 16
+
+# Task logs can run to megabytes; they are streamed to disk in 64KB chunks
+# and only a short tail is kept inline for the analysis prompt.
+_LOG_DUMP_DIR = os.getenv("LOG_DUMP_DIR", "logs")
+_LOG_CHUNK_SIZE = 64 * 1024
+_INLINE_TAIL_BYTES = 4096
+
+# Endpoint templates shared by every log fetch.
+_URL_DAGS = f"{AIRFLOW_URL}/api/v1/dags"
+_URL_DAG_RUNS = f"{AIRFLOW_URL}/api/v1/dags/{{dag_id}}/dagRuns"
+_URL_TASK_INSTANCES = _URL_DAG_RUNS + "/{dag_run_id}/taskInstances"
+_URL_TASK_LOGS = _URL_TASK_INSTANCES + "/{task_id}/logs/{task_try_number}"
+
+# The DAG list changes rarely; cache it (and the display-name -> id map
+# derived from it) for a minute so repeated lookups skip the API entirely.
+_dags_cache: TTLCache = TTLCache(maxsize=2, ttl=60)
+
+
+async def fetch_dags() -> list:
+    cached = _dags_cache.get("dags")
+    if cached is not None:
+        return cached
     try:
-        response = requests.get(dag_runs_url, auth=(USERNAME, PASSWORD))
+        response = await _HTTP.get(_URL_DAGS)
         response.raise_for_status()
-        dag_runs = response.json().get("dag_runs", [])
-
-        logs = {}
-
-        for dag_run in dag_runs:
-            dag_run_id = dag_run.get("dag_run_id", "unknown")
-            task_instances_url = (
-                f"{AIRFLOW_URL}/api/v1/dags/{dag_id}/dagRuns/{dag_run_id}/taskInstances"
-            )
-            task_response = requests.get(task_instances_url, auth=(USERNAME, PASSWORD))
-            task_response.raise_for_status()
-            task_instances = task_response.json().get("task_instances", [])
-
-            for task in task_instances:
-                task_id = task.get("task_id", "unknown")
-                task_try_number = task.get(
-                    "try_number", 1
-                )  # Default to the first try if not specified
-                logs_url = f"{AIRFLOW_URL}/api/v1/dags/{dag_id}/dagRuns/{dag_run_id}/taskInstances/{task_id}/logs/{task_try_number}"
-
-                # Fetch logs
-                log_response = requests.get(logs_url, auth=(USERNAME, PASSWORD))
-
-                # Check if the response is valid JSON
+        data = orjson.loads(response.content)
+        # Return a list of dictionaries containing dag_id and dag_name
+        dags = [
+            {
+                "dag_id": dag.get("dag_id", "unknown"),
+                "dag_name": dag.get("dag_display_name", "unknown"),
+            }
+            for dag in data.get("dags", [])
+        ]
+        _dags_cache["dags"] = dags
+        _dags_cache["name_to_id"] = {dag["dag_name"]: dag["dag_id"] for dag in dags}
+        return dags
+    except Exception as e:
+        logger.error(f"Error fetching DAGs: {e}")
+        return []
+
+
+async def resolve_dag_id(dag_name: str) -> str:
+    """Maps a DAG display name to its dag_id via the cached DAG list; returns
+    the input unchanged when it already is an id (or the list is unavailable)."""
+    await fetch_dags()
+    name_to_id = _dags_cache.get("name_to_id") or {}
+    return name_to_id.get(dag_name, dag_name)
+
+
+async def _fetch_task_instances(dag_id: str, dag_run_id: str, semaphore) -> list:
+    async with semaphore:
+        response = await _HTTP.get(
+            _URL_TASK_INSTANCES.format(dag_id=dag_id, dag_run_id=dag_run_id)
+        )
+        response.raise_for_status()
+        return orjson.loads(response.content).get("task_instances", [])
+
+
+async def _fetch_task_log(dag_id: str, dag_run_id: str, task: dict, semaphore) -> tuple:
+    task_id = task.get("task_id", "unknown")
+    task_try_number = task.get(
+        "try_number", 1
+    )  # Default to the first try if not specified
+    logs_url = _URL_TASK_LOGS.format(
+        dag_id=dag_id,
+        dag_run_id=dag_run_id,
+        task_id=task_id,
+        task_try_number=task_try_number,
+    )
+    # Run id and try number in both the key and the path keep concurrent
+    # fetches of the same task across runs from clobbering one file.
+    key = f"{dag_run_id}/{task_id}"
+    try:
+        path = os.path.join(
+            _LOG_DUMP_DIR, dag_id, dag_run_id, f"{task_id}.{task_try_number}.log"
+        )
+        await asyncio.to_thread(os.makedirs, os.path.dirname(path), exist_ok=True)
+        size = 0
+        tail = b""
+        async with semaphore:
+            async with _HTTP.stream("GET", logs_url) as log_response:
+                log_response.raise_for_status()
+                # File I/O goes through the executor; only the network reads
+                # run on the event loop.
+                f = await asyncio.to_thread(open, path, "wb")
                 try:
-                    log_response.raise_for_status()
-                    if log_response.headers.get("Content-Type") == "application/json":
-                        log_data = log_response.json()
-                        logs[task_id] = log_data.get("logs", "No logs found.")
-                    else:
-                        # If not JSON, return the raw text
-                        logs[task_id] = log_response.text
-                except json.JSONDecodeError as json_err:
-                    logs[task_id] = f"Error fetching logs: {json_err}"
-                except Exception as e:
-                    logs[task_id] = f"Error fetching logs for task {task_id}: {e}"
-
-        return logs  # Return a dictionary of logs keyed by task_id
+                    async for chunk in log_response.aiter_bytes(_LOG_CHUNK_SIZE):
+                        await asyncio.to_thread(f.write, chunk)
+                        size += len(chunk)
+                        tail = (tail + chunk)[-_INLINE_TAIL_BYTES:]
+                finally:
+                    await asyncio.to_thread(f.close)
+        return key, {
+            "path": path,
+            "bytes": size,
+            "tail": tail.decode(errors="replace"),
+        }
+    except Exception as e:
+        return key, f"Error fetching logs for task {task_id}: {e}"
+
+
+async def fetch_logs_for_dag(dag_id: str) -> dict:
+    """Fetches task logs for every run of a DAG, fanning out the per-run and
+    per-task requests concurrently instead of walking them one by one."""
+    try:
+        dag_id = await resolve_dag_id(dag_id)
+        response = await _HTTP.get(_URL_DAG_RUNS.format(dag_id=dag_id))
+        response.raise_for_status()
+        dag_runs = orjson.loads(response.content).get("dag_runs", [])
+
+        semaphore = asyncio.Semaphore(_FANOUT_LIMIT)
+        run_ids = [run.get("dag_run_id", "unknown") for run in dag_runs]
+        task_lists = await asyncio.gather(
+            *(_fetch_task_instances(dag_id, run_id, semaphore) for run_id in run_ids)
+        )
+
+        log_fetches = [
+            _fetch_task_log(dag_id, run_id, task, semaphore)
+            for run_id, task_instances in zip(run_ids, task_lists)
+            for task in task_instances
+        ]
+        logs = dict(await asyncio.gather(*log_fetches))
+
+        return logs  # Return a dictionary of logs keyed by "run_id/task_id"
     except Exception as e:
-        print(f"Error fetching logs for DAG {dag_id}: {e}")
+        logger.error(f"Error fetching logs for DAG {dag_id}: {e}")
         return {}
 
 
 # # Example usage
 # if __name__ == "__main__":
-#     dags = fetch_dags()
+#     dags = asyncio.run(fetch_dags())
 #     if dags:
 #         # Example: Fetch logs for a specific DAG ID
 #         dag_id = dags[0]["dag_id"]  # Get the first DAG ID for demonstration
-#         logs = fetch_logs_for_dag(dag_id)
+#         logs = asyncio.run(fetch_logs_for_dag(dag_id))
 #         print(f"Logs for DAG ID '{dag_id}':", logs)
 
 #     else:
@@ -1,46 +1,94 @@
 from langchain_core.tools import tool
-import json
-import requests
+import asyncio
+import logging
+import orjson
 import os
 
+import httpx
+
+logger = logging.getLogger(__name__)
 
 SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN")
 SLACK_CHANNEL_ID = os.getenv("SLACK_CHANNEL_ID")
 
+# Shared async client; Slack posts reuse one keep-alive connection pool.
+_HTTP = httpx.AsyncClient(
+    timeout=10,
+    limits=httpx.Limits(max_connections=8, max_keepalive_connections=8),
+)
 
-@tool
-def send_to_slack(message: str) -> str:
-    """
-    Sends a message to a specific Slack channel.
+# Notifications are queued and flushed periodically so a burst of DAG failures
+# becomes one coalesced chat.postMessage instead of N posts that trip Slack's
+# rate limits. asyncio queues and tasks belong to one event loop, and the app
+# variants call this tool from different loops (uvicorn's and the worker
+# thread's), so each running loop gets its own queue and flusher rather than
+# sharing one pair across loops, which is not thread-safe.
+_FLUSH_INTERVAL = 0.2  # seconds
+_BATCH_SEPARATOR = "\n---\n"
+_QUEUE_MAX = 1000
 
-    Args:
-        message (str): The message to send to Slack.
+_loop_queues: dict = {}
 
-    Returns:
-        str: A message indicating whether the message was sent successfully or if there was an error.
-    """
-    slack_bot_token = SLACK_BOT_TOKEN
-    slack_channel_id = SLACK_CHANNEL_ID
-
-    if not slack_bot_token or not slack_channel_id:
-        return "Error: SLACK_BOT_TOKEN or SLACK_CHANNEL_ID not set in environment variables."
 
+async def _post_message(text: str) -> str:
     url = "https://slack.com/api/chat.postMessage"
     headers = {
-        "Authorization": f"Bearer {slack_bot_token}",
+        "Authorization": f"Bearer {SLACK_BOT_TOKEN}",
         "Content-Type": "application/json; charset=utf-8",
     }
     data = {
-        "channel": slack_channel_id,
-        "text": message,
+        "channel": SLACK_CHANNEL_ID,
+        "text": text,
     }
     try:
-        response = requests.post(url, headers=headers, data=json.dumps(data))
+        response = await _HTTP.post(url, headers=headers, content=orjson.dumps(data))
         response.raise_for_status()
         result = response.json()
         if result.get("ok"):
             return f"Message sent to Slack successfully. \n  Try this Solution: {str(result)}"
         else:
             return f"Error sending message to Slack: {result.get('error')}"
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         return f"Error sending message to Slack: {e}"
+
+
+async def _flush_pending(queue: "asyncio.Queue[str]"):
+    while True:
+        await asyncio.sleep(_FLUSH_INTERVAL)
+        messages = []
+        while not queue.empty():
+            messages.append(queue.get_nowait())
+        if messages:
+            result = await _post_message(_BATCH_SEPARATOR.join(messages))
+            if result.startswith("Error"):
+                logger.error("Slack flush of %d message(s) failed: %s", len(messages), result)
+
+
+def _get_queue() -> "asyncio.Queue[str]":
+    loop = asyncio.get_running_loop()
+    queue = _loop_queues.get(loop)
+    if queue is None:
+        queue = _loop_queues[loop] = asyncio.Queue(maxsize=_QUEUE_MAX)
+        loop.create_task(_flush_pending(queue))
+    return queue
+
+
+@tool
+async def send_to_slack(message: str) -> str:
+    """
+    Queues a message for delivery to a specific Slack channel.
+
+    Messages queued within the same flush window are coalesced into a single
+    Slack post.
+
+    Args:
+        message (str): The message to send to Slack.
+
+    Returns:
+        str: A message indicating whether the message was queued or if there was an error.
+    """
+    if not SLACK_BOT_TOKEN or not SLACK_CHANNEL_ID:
+        return "Error: SLACK_BOT_TOKEN or SLACK_CHANNEL_ID not set in environment variables."
+
+    await _get_queue().put(message)
+    return "Message queued for delivery to Slack."
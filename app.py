@@ -1,20 +1,26 @@
 import os
 import time
-import hmac
-import hashlib
-import json
-import re
-from typing import Dict, List
+import orjson
+from typing import Dict
 import logging
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from dotenv import load_dotenv
 from agent_handler.agent import agent
 from pydantic import BaseModel
 import asyncio
-from parse_slack_event.slack_parser import parse_slack_text  # Import the function
-import uuid
+from slack_handler.utils import (
+    append_event,
+    flush_all_appenders,
+    parse_slack_text,
+    read_body,
+    LazyJson,
+)
+from slack_handler.verifier import verify_slack_signature
+from cachetools import TTLCache
+from collections import OrderedDict
 import queue  # Import the queue module
+from queue import Empty
 from threading import Thread  # Import the Thread module
 
 load_dotenv()
@@ -23,79 +29,68 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')  # Corrected logging format
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
-SLACK_SIGNING_SECRET = os.getenv("SLACK_SIGNING_SECRET")
+from config import SLACK_RESPONSE_FILE, AGENT_RESPONSE_FILE
 
-SLACK_RESPONSE_FILE = "slack_response/slack_response.json"  # Define the file path
-AGENT_RESPONSE_FILE = "agent_response/agent_response.json"  # Define the agent response file path
+# Bounded LRU of processed timestamps (for duplicate detection within session);
+# a plain set would grow without limit for the life of the process.
+_SEEN_MAX = 10_000
+processed_timestamps: OrderedDict = OrderedDict()
 
-# In-memory set to store processed timestamps (for duplicate detection within session)
-processed_timestamps = set()
 
-# Queue for asynchronous event processing
-event_queue = queue.Queue()
+def _seen_timestamp(timestamp) -> bool:
+    """Marks a timestamp as seen; returns True if it was already recorded."""
+    if timestamp in processed_timestamps:
+        processed_timestamps.move_to_end(timestamp)
+        return True
+    processed_timestamps[timestamp] = None
+    if len(processed_timestamps) > _SEEN_MAX:
+        processed_timestamps.popitem(last=False)
+    return False
 
-def load_existing_events(filename: str) -> List[Dict]:
-    """Loads existing events from the JSON file."""
-    try:
-        if os.path.exists(filename):
-            with open(filename, "r") as f:
-                return json.load(f)
-        else:
-            return []
-    except Exception as e:
-        logger.error(f"Error loading existing events from {filename}: {e}")
-        return []
+# Slack retries and re-posts can deliver the same alert under a fresh ts, so a
+# second dedup layer keys on what the alert *says* (dag/status/run) and
+# coalesces semantically identical failures for 15 minutes.
+_SEEN_ALERTS: TTLCache = TTLCache(maxsize=10_000, ttl=900)
 
-def save_events(events: List[Dict], filename: str):
-    """Saves the list of events to the JSON file."""
-    try:
-        with open(filename, "w") as f:
-            json.dump(events, f, indent=2)
-        logger.info(f"Events saved to {filename}")
-    except Exception as e:
-        logger.error(f"Error saving events to {filename}: {e}")
+# Queue for asynchronous event processing
+event_queue = queue.Queue()
 
 # Function to process events from the queue
-def process_event(event_data: Dict):
+def process_event(event_data: Dict, loop: asyncio.AbstractEventLoop):
     try:
         text = event_data.get("text")
         timestamp = event_data.get("timestamp")
 
-        parsed_text = parse_slack_text(text)  # Parse the text using the imported function
+        # Reuse the details parsed in the request handler when present
+        parsed_text = event_data.get("text_details") or parse_slack_text(text)
         event_data["text_details"] = parsed_text
 
-        print("🟢 Processing Slack Message:")
-        print(json.dumps(event_data, indent=2))
+        logger.debug("Processing Slack Message: %s", LazyJson(event_data))
 
         # ✅ Check if the message indicates a DAG failure
-        if event_data["text_details"]["status"] == "failed":
-            print("hhhhhhhhhhhhhhh")
+        if event_data["text_details"].status == "failed":
             # Extract the DAG name using regex
-            dag_name = event_data["text_details"].get("dag_name")  # Get dag name from parsed data
+            dag_name = event_data["text_details"].dag_name  # Get dag name from parsed data
 
             if dag_name:
                 logger.info(f"DAG failure detected for DAG: {dag_name}")
 
-                # Call the agent to fetch logs (using asyncio.to_thread to avoid blocking)
+                # Call the agent on the worker thread's persistent loop
                 try:
-                    response = asyncio.run(asyncio.to_thread(agent, f"fetch logs for dag {dag_name}"))  # Run async in sync context
+                    response = loop.run_until_complete(agent(f"fetch logs for dag {dag_name}"))
                     logger.info(f"Agent response: {response}")
 
                     # Store the agent response
                     agent_response_data = {
-                        "id": str(uuid.uuid4()),
+                        "id": f"{dag_name}:{time.time_ns()}",
                         "dag_name": dag_name,
                         "timestamp": time.time(),
                         "response": response
                     }
 
-                    existing_agent_responses = load_existing_events(AGENT_RESPONSE_FILE)
-                    if not isinstance(existing_agent_responses, list):
-                        existing_agent_responses = [existing_agent_responses]
-                    existing_agent_responses.insert(0, agent_response_data)
-                    save_events(existing_agent_responses, AGENT_RESPONSE_FILE)
+                    append_event(agent_response_data, AGENT_RESPONSE_FILE)
 
                     # TODO:  Potentially post the response back to the Slack channel
 
@@ -108,7 +103,7 @@ def process_event(event_data: Dict):
 
 @app.post("/slack/events")
 async def slack_events(request: Request):
-    raw_body = await request.body()
+    raw_body = await read_body(request)
     headers = request.headers
 
     # ✅ Verify the Slack signature
@@ -116,8 +111,8 @@ async def slack_events(request: Request):
         raise HTTPException(status_code=400, detail="Invalid Slack signature")
 
     try:
-        data = json.loads(raw_body)
-    except json.JSONDecodeError:
+        data = orjson.loads(raw_body)
+    except orjson.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid JSON")
 
     # ✅ Respond to Slack's URL verification
@@ -141,62 +136,42 @@ async def slack_events(request: Request):
             logger.warning(f"Received retry attempt {retry_num} with reason: {retry_reason}")
 
         # ✅ Check if the message has already been processed (in-memory)
-        if timestamp in processed_timestamps:
+        if _seen_timestamp(timestamp):
             logger.info(f"Duplicate message detected with timestamp: {timestamp}. Skipping.")
-            return JSONResponse(content={"status": "ok", "message": "Duplicate message. Skipped."})
-
-        # Add the timestamp to the set of processed timestamps
-        processed_timestamps.add(timestamp)
+            return ORJSONResponse(content={"status": "ok", "message": "Duplicate message. Skipped."})
+
+        # ✅ Parse once here and coalesce semantically identical alerts.
+        # Only actual alerts get a key; ordinary messages all parse to the
+        # same empty fields and must not coalesce onto each other.
+        text_details = parse_slack_text(text)
+        if text_details.dag_name:
+            alert_key = "{}|{}|{}".format(
+                text_details.dag_name,
+                text_details.status,
+                text_details.run_id or text_details.run_date,
+            )
+            if alert_key in _SEEN_ALERTS:
+                logger.info(f"Duplicate alert detected: {alert_key}. Skipping.")
+                return ORJSONResponse(content={"status": "ok", "message": "Duplicate alert. Skipped."})
+            _SEEN_ALERTS[alert_key] = True
 
         message_data = {
-            "id": str(uuid.uuid4()),  # Generate a unique ID
+            "id": timestamp,  # Slack's ts is already unique per message
             "user": user,
             "channel": channel,
             "timestamp": timestamp,
             "subtype": subtype,
-            "text": text  # Store the original text here
+            "text": text,  # Store the original text here
+            "text_details": text_details
         }
 
         # Put the event data into the queue for asynchronous processing
         event_queue.put(message_data)
 
         # Immediately return a 200 OK response to Slack
-        return JSONResponse(content={"status": "ok", "message": "Event received and queued for processing."})
+        return ORJSONResponse(content={"status": "ok", "message": "Event received and queued for processing."})
 
-    return JSONResponse(content={"status": "ok"})
-
-def write_json_to_file(data: dict, filename: str):
-    """Writes JSON data to a file."""
-    try:
-        with open(filename, "w") as f:
-            json.dump(data, f, indent=2)
-    except Exception as e:
-        logger.error(f"Error writing to file in separate thread: {e}")
-
-def verify_slack_signature(headers: Dict[str, str], raw_body: bytes) -> bool:
-    slack_signature = headers.get("X-Slack-Signature")
-    slack_timestamp = headers.get("X-Slack-Request-Timestamp")
-
-    if not slack_signature or not slack_timestamp:
-        return False
-
-    try:
-        slack_timestamp = float(slack_timestamp)
-    except ValueError:
-        return False
-
-    # Slack allows max 5 min delay
-    if abs(time.time() - slack_timestamp) > 60 * 5:
-        return False
-
-    sig_basestring = f"v0:{int(slack_timestamp)}:{raw_body.decode('utf-8')}"
-    my_signature = "v0=" + hmac.new(
-        SLACK_SIGNING_SECRET.encode(),
-        sig_basestring.encode(),
-        hashlib.sha256
-    ).hexdigest()
-
-    return hmac.compare_digest(my_signature, slack_signature)
+    return ORJSONResponse(content={"status": "ok"})
 
 class QueryRequest(BaseModel):
     query: str
@@ -204,25 +179,36 @@ class QueryRequest(BaseModel):
 @app.post("/query")
 async def handle_query(request: QueryRequest):
     try:
-        response = agent(request.query)
+        response = await agent(request.query)
         return {"response": response}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Start the event processing thread
 def start_event_processor():
+    # One event loop for the lifetime of the worker thread; agent calls reuse
+    # it instead of paying asyncio.run's loop setup/teardown per event.
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
     while True:
         try:
-            event_data = event_queue.get()
-            process_event(event_data)
+            event_data = event_queue.get(timeout=5.0)
+        except Empty:
+            continue
+        try:
+            process_event(event_data, loop)
+        except Exception:
+            logger.exception("Error in event processing thread")
+        finally:
             event_queue.task_done()
-        except Exception as e:
-            logger.error(f"Error in event processing thread: {e}")
-            time.sleep(1)  # Add a small delay to prevent busy-looping
 
 event_processing_thread = Thread(target=start_event_processor, daemon=True)
 event_processing_thread.start()
 
+@app.on_event("shutdown")
+def _flush_event_logs():
+    flush_all_appenders()
+
 # Run with: python main.py
 if __name__ == "__main__":
     import uvicorn
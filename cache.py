@@ -0,0 +1,55 @@
+import os
+import hashlib
+import logging
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+_client = None
+_unavailable = False
+
+
+def get_client():
+    """Returns the shared Redis client, or None if Redis cannot be reached.
+    The first failed connection disables caching for the process lifetime."""
+    global _client, _unavailable
+    if _client is None and not _unavailable:
+        try:
+            _client = redis.Redis.from_url(
+                REDIS_URL, socket_connect_timeout=1, decode_responses=True
+            )
+            _client.ping()
+        except Exception as e:
+            logger.warning(f"Redis unavailable, caching disabled: {e}")
+            _client = None
+            _unavailable = True
+    return _client
+
+
+def query_key(query: str) -> str:
+    """Cache key for an agent query: SHA256 of the normalized query text."""
+    return "agent:" + hashlib.sha256(query.strip().lower().encode()).hexdigest()
+
+
+def cache_get(key: str):
+    client = get_client()
+    if client is None:
+        return None
+    try:
+        return client.get(key)
+    except Exception as e:
+        logger.error(f"Redis GET failed for {key}: {e}")
+        return None
+
+
+def cache_set(key: str, value: str, ttl: int):
+    client = get_client()
+    if client is None:
+        return
+    try:
+        client.setex(key, ttl, value)
+    except Exception as e:
+        logger.error(f"Redis SETEX failed for {key}: {e}")
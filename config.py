@@ -1,5 +1,6 @@
 import os
 
 SLACK_SIGNING_SECRET = os.getenv("SLACK_SIGNING_SECRET")
-SLACK_RESPONSE_FILE = "slack_response/slack_response.json"
-AGENT_RESPONSE_FILE = "agent_response/agent_response.json"
+# Event history is stored as append-only NDJSON: one JSON object per line.
+SLACK_RESPONSE_FILE = "slack_response/slack_response.jsonl"
+AGENT_RESPONSE_FILE = "agent_response/agent_response.jsonl"
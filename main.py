@@ -1,13 +1,37 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import anyio.to_thread
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from dotenv import load_dotenv
 from slack_handler.events import slack_events
+from slack_handler.utils import flush_all_appenders
 from agent_handler.handler import handle_query
 
 load_dotenv()
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 app.include_router(slack_events, prefix="/slack")
 app.include_router(handle_query, prefix="/query")
 
+
+@app.on_event("startup")
+async def _configure_executor():
+    # The default executor caps at min(32, cpu+4) threads, which throttles the
+    # IO-bound to_thread offloads (Redis, file writes) under concurrent load.
+    pool_size = int(os.getenv("AGENT_POOL_SIZE", "64"))
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="agent")
+    )
+    # Keep FastAPI's sync-endpoint limiter consistent with the executor.
+    anyio.to_thread.current_default_thread_limiter().total_tokens = pool_size
+
+
+@app.on_event("shutdown")
+def _flush_event_logs():
+    flush_all_appenders()
+
 # Run with: uvicorn main:app --reload
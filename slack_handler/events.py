@@ -1,15 +1,27 @@
-import json
-import uuid
+import orjson
+import os
+import time
 import asyncio
 import logging
-from datetime import datetime, timezone
+from collections import OrderedDict, deque
+from hashlib import blake2b
 
 from fastapi import APIRouter, Request, HTTPException
-from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 
 from config import SLACK_SIGNING_SECRET, SLACK_RESPONSE_FILE, AGENT_RESPONSE_FILE
 from agent_handler.handler import agent
-from slack_handler.utils import load_existing_events, save_as_json, parse_slack_text
+from slack_handler.utils import (
+    LazyJson,
+    append_event,
+    append_events,
+    iter_events,
+    next_event_id,
+    get_appender,
+    parse_slack_text,
+    read_body,
+    url_verification_challenge,
+)
 from slack_handler.verifier import verify_slack_signature
 
 logging.basicConfig(level=logging.INFO)
@@ -17,31 +29,300 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 slack_events = APIRouter()
 
+# Submission queue: the HTTP handler only enqueues and returns 200, so Slack
+# gets its ack well inside the 3s retry window. Worker coroutines drain the
+# queue in batches and run the agent pipeline off the request path.
+_Q: asyncio.Queue = asyncio.Queue(maxsize=10_000)
+_BATCH_MAX = 64
+
+# Duplicate detection: a Bloom filter answers "definitely new" in O(1) with a
+# handful of bit probes, and an exact set confirms the rare Bloom hits so
+# false positives never drop real alerts. Both are filled once from the event
+# log at startup; the request path never re-reads the file.
+_BLOOM_BITS = 1 << 20
+_BLOOM_HASHES = 7
+_seen_bloom = bytearray(_BLOOM_BITS // 8)
+_seen_set: set = set()
+
+
+def _bloom_probes(key: str):
+    # blake2b gives 32 stable bytes; sliced into 7 independent 4-byte probes.
+    digest = blake2b(key.encode(), digest_size=32).digest()
+    for i in range(_BLOOM_HASHES):
+        yield int.from_bytes(digest[i * 4 : (i + 1) * 4], "little") % _BLOOM_BITS
+
+
+def _bloom_add(bloom: bytearray, key: str):
+    for bit in _bloom_probes(key):
+        bloom[bit >> 3] |= 1 << (bit & 7)
+
+
+def _dedup_add(dag_name: str, run_date: str):
+    _bloom_add(_seen_bloom, f"{dag_name}|{run_date}")
+    _seen_set.add((dag_name, run_date))
+    if _compacting:
+        # A rebuild is in flight; replayed onto the fresh state once it
+        # swaps in, so pairs recorded mid-compaction survive.
+        _compaction_overlay.append((dag_name, run_date))
+
+
+def _dedup_seen(dag_name: str, run_date: str) -> bool:
+    if all(
+        _seen_bloom[bit >> 3] & (1 << (bit & 7))
+        for bit in _bloom_probes(f"{dag_name}|{run_date}")
+    ):
+        # Bloom hit: confirm against the exact set.
+        return (dag_name, run_date) in _seen_set
+    return False
+
+
+# Slack retries deliveries with the same event_id; a bounded LRU catches the
+# replay before any parsing or business dedup runs.
+_SEEN_IDS_MAX = 10_000
+_seen_event_ids: OrderedDict = OrderedDict()
+
+
+def _seen_event_id(event_id) -> bool:
+    """Marks an event_id as seen; returns True if it was already recorded."""
+    if event_id in _seen_event_ids:
+        _seen_event_ids.move_to_end(event_id)
+        return True
+    _seen_event_ids[event_id] = None
+    if len(_seen_event_ids) > _SEEN_IDS_MAX:
+        _seen_event_ids.popitem(last=False)
+    return False
+
+
+# Recent history lives in process; the NDJSON file is a durable log, never a
+# per-request lookup structure. Newest events sit at the left of the deque.
+_events_cache: deque = deque(maxlen=10_000)
+_events_cache_lock = asyncio.Lock()
+
+# The NDJSON log is append-only, so it grows without bound. Once it passes
+# the cap, a background task rewrites it to the cached window and rebuilds
+# the Bloom/set from the survivors; the request path only bumps a counter.
+_MAX_LOG_ENTRIES = 100_000
+_COMPACT_KEEP = 10_000
+_log_entries = 0
+_compacting = False
+_compaction_overlay: list = []
+
+
+def _event_dedup_key(event) -> tuple:
+    """(dag_name, run_date) for an event, whether its text_details is the
+    in-memory ParsedAlert or the plain dict read back from disk."""
+    details = event.get("text_details")
+    if details is None:
+        return None, None
+    if isinstance(details, dict):
+        return details.get("dag_name"), details.get("run_date")
+    return details.dag_name, details.run_date
+
+
+def _load_dedup_state():
+    global _log_entries
+    for event in iter_events(SLACK_RESPONSE_FILE):
+        _log_entries += 1
+        _events_cache.appendleft(event)
+        dag_name, run_date = _event_dedup_key(event)
+        if dag_name and run_date:
+            _dedup_add(dag_name, run_date)
+    logger.info(
+        "Loaded %d known (dag, run_date) pairs for dedup (%d recent events cached)",
+        len(_seen_set),
+        len(_events_cache),
+    )
+
+
+def _rebuild_dedup_state() -> tuple:
+    """Runs on a worker thread: truncates the log file to its own tail and
+    builds fresh dedup structures from the surviving lines. Compacting from
+    the file rather than a cache snapshot means appends racing with the
+    rebuild are either in the tail already or blocked until the swap — never
+    silently dropped from history."""
+    appender = get_appender(SLACK_RESPONSE_FILE)
+    lines = appender.truncate_to_tail(_COMPACT_KEEP)
+    bloom = bytearray(_BLOOM_BITS // 8)
+    pairs = set()
+    for line in lines:
+        event = orjson.loads(line)
+        dag_name, run_date = _event_dedup_key(event)
+        if dag_name and run_date:
+            _bloom_add(bloom, f"{dag_name}|{run_date}")
+            pairs.add((dag_name, run_date))
+    return len(lines), bloom, pairs
+
+
+async def _compact_log():
+    global _compacting, _log_entries
+    try:
+        before = _log_entries
+        count, bloom, pairs = await asyncio.to_thread(_rebuild_dedup_state)
+        # Swap and replay with no await in between, so no request can
+        # interleave between the fresh state and the overlay.
+        _seen_bloom[:] = bloom
+        _seen_set.clear()
+        _seen_set.update(pairs)
+        _log_entries = count + (_log_entries - before)
+        _compacting = False
+        for dag_name, run_date in _compaction_overlay:
+            _dedup_add(dag_name, run_date)
+        logger.info(
+            "Compacted event log to %d entries (%d dedup pairs retained)",
+            count,
+            len(_seen_set),
+        )
+    except Exception as e:
+        logger.error(f"Error compacting event log: {e}")
+    finally:
+        _compacting = False
+        _compaction_overlay.clear()
+
+
+async def recent_events(n: int) -> list:
+    """Returns the newest n events without touching the log file."""
+    async with _events_cache_lock:
+        return [_events_cache[i] for i in range(min(n, len(_events_cache)))]
+
+
+@slack_events.get("/events/recent")
+async def get_recent_events(limit: int = 50):
+    """Serves the newest events from the in-memory window; the log file is
+    never read on this path."""
+    return ORJSONResponse(content={"events": await recent_events(limit)})
+
+
+@slack_events.on_event("startup")
+async def _start_workers():
+    _load_dedup_state()
+    for _ in range(os.cpu_count() or 4):
+        asyncio.create_task(_worker())
+
+
+async def _worker():
+    while True:
+        batch = [await _Q.get()]
+        while len(batch) < _BATCH_MAX and not _Q.empty():
+            batch.append(_Q.get_nowait())
+        try:
+            await _process_batch(batch)
+        except Exception as e:
+            logger.error(f"Error processing event batch: {e}")
+        finally:
+            for _ in batch:
+                _Q.task_done()
+
+
+async def _process_batch(batch):
+    # One pass of appends for the whole batch; the buffered appender turns
+    # these into a single write/fsync.
+    global _compacting, _log_entries
+    async with _events_cache_lock:
+        for message_data in batch:
+            _events_cache.appendleft(message_data)
+    append_events(batch, SLACK_RESPONSE_FILE)
+    _log_entries += len(batch)
+    if _log_entries > _MAX_LOG_ENTRIES and not _compacting:
+        _compacting = True
+        asyncio.create_task(_compact_log())
+
+    failures = [
+        message_data
+        for message_data in batch
+        if message_data["text_details"].status == "failed"
+        and message_data["text_details"].dag_name
+    ]
+    if failures:
+        await asyncio.gather(
+            *(_run_agent_pipeline(message_data) for message_data in failures)
+        )
+
+
+async def _run_agent_pipeline(message_data):
+    dag_name = message_data["text_details"].dag_name
+    logger.info(f"DAG failure detected: {dag_name}")
+    try:
+        # DAG details and logs don't depend on each other; fetch both at once
+        # so the pipeline's latency is the slower of the two, not their sum.
+        logger.info("Fetching DAG details and logs...")
+        dag_details, logs = await asyncio.gather(
+            agent(
+                f"Use the DAG Details Fetching Tool to get information for the DAG named '{dag_name}'."
+            ),
+            agent(f"Use the Log Fetching Tool to get logs for the DAG '{dag_name}'."),
+        )
+
+        logger.debug("DAG details fetched: %s", LazyJson(dag_details))
+
+        # Then, analyze the logs
+        logger.info("Analyzing logs...")
+        analysis = await agent(
+            f"Use the Log Analysis Tool. Analyze these logs for DAG '{dag_name}' and give a summary: {logs}"
+        )
+
+        # Send the analysis to Slack
+        logger.info("Sending analysis to Slack...")
+        slack_message_result = await agent(
+            f"Send a Slack message about an error in DAG '{dag_name}'. Use this analysis: {analysis}"
+        )
+
+    except Exception as e:
+        logger.error(f"Agent error: {e}")
+        dag_details = f"Error fetching DAG details: {e}"
+        logs = f"Error fetching logs: {e}"
+        analysis = f"Error analyzing logs: {e}"
+        slack_message_result = f"Error sending message to Slack: {e}"
+
+    agent_response_data = {
+        "id": f"{dag_name}:{time.time_ns()}",
+        "dag_name": dag_name,
+        "timestamp": message_data["timestamp"],
+        "dag_details": dag_details,
+        "logs": logs,
+        "analysis": analysis,
+        "slack_message_result": slack_message_result,
+    }
+
+    append_event(agent_response_data, AGENT_RESPONSE_FILE)
+
 
 @slack_events.post("/events")
 async def handle_slack_event(request: Request):
     """
     Handles incoming Slack events, verifies the signature, parses the event,
-    checks for duplicates, and triggers the agent if necessary.
+    checks for duplicates, and queues it for background processing.
     """
-    raw_body = await request.body()
+    raw_body = await read_body(request)
     headers = request.headers
 
     if not verify_slack_signature(headers, raw_body):
         raise HTTPException(status_code=400, detail="Invalid Slack signature")
 
+    # Warmup handshake: answer without parsing the body as JSON.
+    challenge = url_verification_challenge(raw_body)
+    if challenge is not None:
+        return PlainTextResponse(content=challenge)
+
     try:
-        data = json.loads(raw_body)
-    except json.JSONDecodeError:
+        data = orjson.loads(raw_body)
+    except orjson.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid JSON")
 
+    # Slow path for handshakes the sniff missed (unusual key order or
+    # whitespace); correctness never depends on the fast path above.
     if data.get("type") == "url_verification":
         return PlainTextResponse(content=data["challenge"])
 
-    event = data.get("event")
+    # Slack redelivers the same envelope under one event_id on retries;
+    # drop replays before any parsing work.
+    event_id = data.get("event_id")
+    if event_id and _seen_event_id(event_id):
+        logger.info(f"Duplicate delivery for event_id {event_id}. Skipping.")
+        return ORJSONResponse(
+            content={"status": "ok", "message": "Duplicate delivery. Skipped."}
+        )
 
-    # print("Event data:")
-    # print(json.dumps(event, indent=2))
+    event = data.get("event")
 
     # Check if the event is a message
     if event and event.get("type") == "message":
@@ -49,134 +330,66 @@ async def handle_slack_event(request: Request):
         text = event.get("text")
         channel = event.get("channel")
         subtype = event.get("subtype", "user")
-        timestamp = datetime.now(timezone.utc).isoformat()
+        # Epoch nanoseconds: one clock read, no datetime object or strftime.
+        timestamp = time.time_ns()
 
         parsed_text = parse_slack_text(text)
 
         message_data = {
-            "id": str(uuid.uuid4()),
+            # Slack's ts is unique per message; no need for a urandom read.
+            "id": event.get("ts") or next_event_id(),
             "user": user,
             "channel": channel,
             "timestamp": timestamp,
             "subtype": subtype,
             "text_details": parsed_text,
         }
-        # print("Message data:")
-        # print(json.dumps(message_data, indent=2))  # Log the message data
-
-        # Duplicate Check Logic
-        # dag_name = parsed_text.get("dag_name")
-        # run_date = parsed_text.get("run_date")
 
-        dag_name = message_data.get("text_details", {}).get("dag_name")
-        run_date = message_data.get("text_details", {}).get("run_date")
+        dag_name = parsed_text.dag_name
+        run_date = parsed_text.run_date
 
         if dag_name and run_date:
-            existing_events = load_existing_events(SLACK_RESPONSE_FILE)
-            is_duplicate = any(
-                event["text_details"].get("dag_name") == dag_name
-                and event["text_details"].get("run_date") == run_date
-                for event in existing_events
-            )
-
-            if is_duplicate:
+            if _dedup_seen(dag_name, run_date):
                 logger.info(
                     f"Duplicate event detected for DAG: {dag_name}, Run Date: {run_date}. Ignoring."
                 )
-                return JSONResponse(
+                return ORJSONResponse(
                     content={
                         "status": "ok",
                         "message": "Duplicate event.  No action taken.",
                     }
                 )
-            else:
-                logger.info(
-                    "Incoming Slack Message: %s", json.dumps(message_data, indent=2)
-                )  # Log only if not duplicate
+            _dedup_add(dag_name, run_date)
+            logger.debug(
+                "Incoming Slack Message: %s", LazyJson(message_data)
+            )  # Log only if not duplicate
 
         else:
-            logger.info(
-                "Incoming Slack Message: %s", json.dumps(message_data, indent=2)
+            logger.debug(
+                "Incoming Slack Message: %s", LazyJson(message_data)
             )  # Log if dag_name or run_date is missing
 
-        # Save the message (if not a duplicate or if dag_name/run_date are missing)
-        existing_events = load_existing_events(SLACK_RESPONSE_FILE)
-        existing_events.insert(0, message_data)
-        save_as_json(existing_events, SLACK_RESPONSE_FILE)
-
-        # Agent Trigger Logic (only if DAG failed and not a duplicate)
-        if message_data.get("text_details", {}).get("status") == "failed" and dag_name:
-            # if message_data.get("status") == "failed" and dag_name:
-            # if parsed_text.get("status") == "failed" and dag_name:
-            logger.info(f"DAG failure detected: {dag_name}")
-            try:
-                # Fetch the DaG details
-                print("Fetching DAG details...")
-                dag_details = await asyncio.to_thread(
-                    agent,
-                    f"Use the DAG Details Fetching Tool to get information for the DAG named '{dag_name}'.",
-                )
-
-                logger.info(f"DAG details fetched: {json.dumps(dag_details, indent=2)}")
-
-                # print("Saving DAG details to JSON...")
-                # save_dag_details_result = await asyncio.to_thread(
-                #     agent,
-                #     f"Now save the fetched DAG details to a JSON file. This is the DAG details: {dag_details}",
-                # )
-
-                # logger.info(f"DAG details saved to JSON: {save_dag_details_result}")
-                print("Fetching logs...")
-                logs = await asyncio.to_thread(
-                    agent,
-                    f"Use the Log Fetching Tool to get logs for the DAG '{dag_name}'.",
-                )
-
-                # Then, analyze the logs
-                print("Analyzing logs...")
-                analysis = await asyncio.to_thread(
-                    agent,
-                    f"Use the Log Analysis Tool. Analyze these logs for DAG '{dag_name}' and give a summary: {logs}",
-                )
-
-                # Send the analysis to Slack
-                print("Sending analysis to Slack...")
-                slack_message_result = await asyncio.to_thread(
-                    agent,
-                    f"Send a Slack message about an error in DAG '{dag_name}'. Use this analysis: {analysis}",
-                )
-
-            except Exception as e:
-                logger.error(f"Agent error: {e}")
-                logs = f"Error fetching logs: {e}"
-                analysis = f"Error analyzing logs: {e}"
-                slack_message_result = f"Error sending message to Slack: {e}"
-
-            agent_response_data = {
-                "id": str(uuid.uuid4()),
-                "dag_name": dag_name,
-                "timestamp": timestamp,
-                "dag_details": dag_details,
-                "logs": logs,
-                "analysis": analysis,
-                "slack_message_result": slack_message_result,
-            }
-
-            agent_responses = load_existing_events(AGENT_RESPONSE_FILE)
-            agent_responses.insert(0, agent_response_data)
-            save_as_json(agent_responses, AGENT_RESPONSE_FILE)
-
-            return JSONResponse(
-                content={
-                    "status": "ok",
-                    "message": f"Fetched logs and analysis for {dag_name}",
-                    "dag_details": dag_details,
-                    "logs": logs,
-                    "analysis": analysis,
-                    "slack_message_result": slack_message_result,
-                }
+        # Hand off to the worker pool; persistence and the agent pipeline run
+        # off the request path.
+        try:
+            _Q.put_nowait(message_data)
+        except asyncio.QueueFull:
+            # The 503 makes Slack retry; forget this delivery so the retry
+            # isn't rejected as a duplicate. The Bloom bits stay set, but
+            # _dedup_seen confirms against the exact set, so dropping the
+            # pair there is enough.
+            if event_id:
+                _seen_event_ids.pop(event_id, None)
+            if dag_name and run_date:
+                _seen_set.discard((dag_name, run_date))
+            logger.error("Event queue full; dropping event for DAG %s", dag_name)
+            return ORJSONResponse(
+                content={"status": "error", "message": "Event queue full."},
+                status_code=503,
             )
 
-        return JSONResponse(content={"status": "ok"})  # Normal message processing
+        return ORJSONResponse(
+            content={"status": "ok", "message": "Event queued for processing."}
+        )
 
-    return JSONResponse(content={"status": "ok"})  # Non-message event
+    return ORJSONResponse(content={"status": "ok"})  # Non-message event